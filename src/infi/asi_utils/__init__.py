@@ -20,7 +20,7 @@ Usage:
 
 Options:
     -n NUM, --number=NUM        number of test_unit_ready commands [default: 1]
-    -p PG, --page=PG            page number or abbreviation
+    -p PG, --page=PG            page number, inq also accepts a comma-separated list of pages
     -s SR, --select=SR          select report SR [default: 0]
     --extended                  get rtpg extended response instead of length only
     -l, --long                  use READ CAPACITY (16) cdb
@@ -39,23 +39,31 @@ Options:
 """
 
 from __future__ import print_function
+import os
 import sys
-import docopt
+import binascii
+import warnings
+from contextvars import ContextVar
+from argparse import ArgumentParser
+from collections import deque
+from itertools import repeat
+from infi.asi import executers, SCSIReadCommand, SCSIWriteCommand
+from infi.asi.coroutines.sync_adapter import sync_wait as _sync_wait
+from infi.asi.errors import AsiCheckConditionError, AsiOSError, AsiSCSIError
+from infi.os_info import get_platform_string
 from infi.pyutils.contexts import contextmanager
 from infi.pyutils.decorators import wraps
 from . import formatters
+from .coroutines import execute_concurrently
 
 
 def exception_handler(func):
-    from infi.asi.errors import AsiCheckConditionError
-    from infi.asi.errors import AsiOSError, AsiSCSIError
-
     @wraps(func)
     def wrapper(*args, **kwargs):
         try:
             return func(*args, **kwargs)
         except AsiCheckConditionError as error:
-            ActiveOutputContext.output_error(error.sense_obj, file=sys.stderr)
+            get_output_context().output_error(error.sense_obj, file=sys.stderr)
         except (ValueError, NotImplementedError) as error:
             print(error, file=sys.stderr)
             raise SystemExit(1)
@@ -65,91 +73,208 @@ def exception_handler(func):
     return wrapper
 
 
+# formatters without state are shared instead of being created for every output context or error
+DEFAULT_FORMATTER = formatters.DefaultOutputFormatter()
+ERROR_FORMATTER = formatters.ErrorOutputFormatter()
+HEX_FORMATTER = formatters.HexOutputFormatter()
+RAW_FORMATTER = formatters.RawOutputFormatter()
+JSON_FORMATTER = formatters.JsonOutputFormatter()
+
+
 class OutputContext(object):
     def __init__(self):
         super(OutputContext, self).__init__()
         self._verbose = False
-        self._command_formatter = formatters.DefaultOutputFormatter()
-        self._result_formatter = formatters.DefaultOutputFormatter()
+        self.set_formatters(DEFAULT_FORMATTER)
 
     def enable_verbose(self):
         self._verbose = True
 
     def set_command_formatter(self, formatter):
         self._command_formatter = formatter
+        self._format_command = formatter.format
 
     def set_result_formatter(self, formatter):
         self._result_formatter = formatter
+        self._format_result = formatter.format
 
     def set_formatters(self, formatter):
         self.set_command_formatter(formatter)
         self.set_result_formatter(formatter)
 
     def _print(self, string, file=sys.stdout):
-        print(string, file=file)
+        if isinstance(string, bytes):
+            # raw output goes to the binary buffer under text streams, after any text already written to them
+            file.flush()
+            stream = getattr(file, 'buffer', file)
+            stream.write(string + b'\n')
+            stream.flush()
+        else:
+            print(string, file=file)
 
     def output_command(self, command, file=sys.stdout):
         if not self._verbose:
             return
-        self._print(self._command_formatter.format(command), file=file)
+        self._print(self._format_command(command), file=file)
 
     def output_result(self, result, file=sys.stdout):
-        self._print(self._result_formatter.format(result), file=file)
+        self._print(self._format_result(result), file=file)
 
     def output_error(self, result, file=sys.stdout):
-        self._print(formatters.ErrorOutputFormatter().format(result), file=file)
+        self._print(ERROR_FORMATTER.format(result), file=file)
+
+
+# each invocation sets its own output context, so concurrent threads and tasks don't share formatter settings
+ActiveOutputContext = ContextVar('ActiveOutputContext', default=None)
+
+def get_output_context():
+    """ Returns the output context of the current thread or task, creating one on first use """
+    output_context = ActiveOutputContext.get()
+    if output_context is None:
+        output_context = OutputContext()
+        ActiveOutputContext.set(output_context)
+    return output_context
+
 
+# the platform doesn't change while we run, and infi.os_info takes milliseconds to work it out
+PLATFORM_NAME = get_platform_string().split('-')[0]
 
-ActiveOutputContext = OutputContext()
+def linux_executer(device):
+    from infi.sgutils.sg_map import get_sg_from_sd
+    from .executers import linux_sg, linux_dm
+    if device.startswith('/dev/sd'):
+        device = get_sg_from_sd(device)
+    return linux_sg(device) if device.startswith('/dev/sg') else linux_dm(device)
 
+EXECUTERS = dict(windows=executers.windows, linux=linux_executer, solaris=executers.solaris, aix=executers.aix)
 
 @contextmanager
 def asi_context(device):
-    from infi.asi import executers
-    from infi.os_info import get_platform_string
-    platform = get_platform_string()
-    if platform.startswith('windows'):
-        _func = executers.windows
-    elif platform.startswith('linux'):
-        if device.startswith('/dev/sd'):
-            from infi.sgutils.sg_map import get_sg_from_sd
-            device = get_sg_from_sd(device)
-        _func = executers.linux_sg if device.startswith('/dev/sg') else executers.linux_dm
-    elif platform.startswith('solaris'):
-        _func = executers.solaris
-    elif platform.startswith('aix'):
-        _func = executers.aix
-    else:
+    if PLATFORM_NAME not in EXECUTERS:
         raise NotImplementedError("this platform is not supported")
-    with _func(device) as executer:
+    with EXECUTERS[PLATFORM_NAME](device) as executer:
         yield executer
 
-def sync_wait(asi, command, supresss_output=False, additional_data=None):
-    from infi.asi.coroutines.sync_adapter import sync_wait as _sync_wait
-    ActiveOutputContext.output_command(command)
+def _deprecated_suppress_output(kwargs):
+    # older versions spelled the keyword supresss_output
+    if set(kwargs) != {'supresss_output'}:
+        raise TypeError("unexpected keyword arguments: %s" % ', '.join(sorted(kwargs)))
+    warnings.warn("supresss_output is deprecated, use suppress_output instead", DeprecationWarning, stacklevel=3)
+    return kwargs['supresss_output']
+
+def sync_wait_silent(asi, command, additional_data=None):
+    """ Like sync_wait with suppress_output; only the result is suppressed, the command is still printed
+    when verbose """
+    get_output_context().output_command(command)
     result = _sync_wait(command.execute(asi))
     if additional_data:
         for key, value in additional_data.items():
             setattr(result, key, value)
-    if not supresss_output:
-        ActiveOutputContext.output_result(result)
     return result
 
-def parse_key(key):
-    return int(key, 16) if key.startswith('0x') else int(key)
+def sync_wait(asi, command, *, suppress_output=False, additional_data=None, **deprecated):
+    if deprecated:
+        suppress_output = _deprecated_suppress_output(deprecated)
+    if suppress_output:
+        return sync_wait_silent(asi, command, additional_data)
+    result = sync_wait_silent(asi, command, additional_data)
+    get_output_context().output_result(result)
+    return result
+
+def make_sync_wait(*, suppress_output=False):
+    """ Returns a sync_wait(asi, command) specialized for the current output context, for callers that execute
+    commands repeatedly; the verbose and suppress checks are made here once instead of on every call """
+    output_context = get_output_context()
+    output_command = output_context.output_command
+    output_result = output_context.output_result
+
+    def quiet_sync_wait(asi, command):
+        return _sync_wait(command.execute(asi))
+
+    def quiet_sync_wait_with_output(asi, command):
+        result = _sync_wait(command.execute(asi))
+        output_result(result)
+        return result
+
+    def verbose_sync_wait(asi, command):
+        output_command(command)
+        return _sync_wait(command.execute(asi))
+
+    def verbose_sync_wait_with_output(asi, command):
+        output_command(command)
+        result = _sync_wait(command.execute(asi))
+        output_result(result)
+        return result
+
+    if output_context._verbose:
+        return verbose_sync_wait if suppress_output else verbose_sync_wait_with_output
+    return quiet_sync_wait if suppress_output else quiet_sync_wait_with_output
+
+def sync_wait_all(asi, commands, *, suppress_output=False, keep_results=True):
+    """ Like sync_wait, but keeps as many of the commands in flight as the executer's queue allows; returns the
+    results, or None when keep_results is False """
+    output_context = get_output_context()
+    output_command = output_context.output_command
+    output_result = output_context.output_result
+    verbose = output_context._verbose
+    # commands are sent a queue at a time, the sent ones wait here to be printed next to their results
+    sent = deque()
+
+    def record_sent(commands):
+        for command in commands:
+            sent.append(command)
+            yield command
+
+    results = [] if keep_results else None
+    try:
+        for result in execute_concurrently(asi, record_sent(commands) if verbose else commands):
+            if verbose:
+                output_command(sent.popleft())
+            if not suppress_output:
+                output_result(result)
+            if keep_results:
+                results.append(result)
+    except Exception:
+        if sent:
+            # the failed command, printed before its error like the results before it
+            output_command(sent.popleft())
+        raise
+    return results
+
+HEX_DIGITS = frozenset('0123456789abcdefABCDEF')
+
+def parse_number(value, description):
+    """ Parses a decimal or 0x-prefixed hexadecimal number from the command line; None is passed through """
+    if value is None:
+        return None
+    # int() alone would also accept signs, whitespace and underscores
+    is_hex = value.startswith('0x')
+    digits = value[2:] if is_hex else value
+    if is_hex and digits != '' and all(char in HEX_DIGITS for char in digits):
+        return int(digits, 16)
+    if not is_hex and digits.isdecimal():
+        return int(digits, 10)
+    raise ValueError("invalid %s: %s" % (description, value))
+
+def parse_numbers(value, description):
+    """ Like parse_number, but a comma-separated value is parsed into a list of numbers """
+    if value is None or ',' not in value:
+        return parse_number(value, description)
+    return [parse_number(item, description) for item in value.split(',')]
 
 def pr_in_command(service_action, device):
     from infi.asi.cdb.persist.input import PersistentReserveInCommand
     allocation_length = 520
+    execute = make_sync_wait(suppress_output=True)
     with asi_context(device) as asi:
         allocated_enough = False
         while not allocated_enough:
             command = PersistentReserveInCommand(service_action=service_action,
                                                  allocation_length=allocation_length)
-            response = sync_wait(asi, command, supresss_output=True)
+            response = execute(asi, command)
             allocated_enough = allocation_length >= response.required_allocation_length()
             allocation_length = response.required_allocation_length()
-        ActiveOutputContext.output_result(response)
+        get_output_context().output_result(response)
 
 def pr_out_command(command, device):
     with asi_context(device) as asi:
@@ -165,70 +290,88 @@ def pr_readreservation(device):
 
 def turs(device, number):
     from infi.asi.cdb.tur import TestUnitReadyCommand
-    with asi_context(device) as asi:
-        for i in range(int(number)):
-            command = TestUnitReadyCommand()
-            sync_wait(asi, command)
 
-def inq(device, page, supresss_output=False):
-    from infi.asi.cdb.inquiry import standard, vpd_pages
+    class CDB(object):
+        def execute(self, executer):
+            yield executer.call(SCSIReadCommand(datagram, 0))
+            yield True
+
+    # the command is the same every time, so serialize it once; it is only formatted when verbose
+    command = TestUnitReadyCommand()
+    datagram = command.create_datagram()
+    with asi_context(device) as asi:
+        sync_wait_all(asi, repeat(command if get_output_context()._verbose else CDB(), number), keep_results=False)
+
+def vpd_page_command(page):
+    from infi.asi.cdb.inquiry import vpd_pages
+    command_class = vpd_pages.get_vpd_page(page)
+    if command_class is None:
+        raise ValueError("unsupported vpd page: 0x%02x" % page)
+    return command_class()
+
+def inq_pages(device, pages, *, suppress_output=False):
+    """ Reads several vpd pages through a single executer, with as many of them in flight as it allows """
+    commands = [vpd_page_command(page) for page in pages]
+    with asi_context(device) as asi:
+        return sync_wait_all(asi, commands, suppress_output=suppress_output)
+
+def inq(device, page, *, suppress_output=False, **deprecated):
+    from infi.asi.cdb.inquiry import standard
+    if deprecated:
+        suppress_output = _deprecated_suppress_output(deprecated)
+    if isinstance(page, list):
+        return inq_pages(device, page, suppress_output=suppress_output)
     additional_data = {}
     if page is None:
         command = standard.StandardInquiryCommand(allocation_length=219)
         try:
-            unit_serial_number_command_result = inq(device, '0x80', supresss_output=True)
+            unit_serial_number_command_result = inq(device, 0x80, suppress_output=True)
         except:
             additional_data = {'product_serial_number': None}
         else:
             additional_data = {'product_serial_number': unit_serial_number_command_result.product_serial_number}
-    elif page.isdigit():
-        command = vpd_pages.get_vpd_page(int(page))()
-    elif page.startswith('0x'):
-        command = vpd_pages.get_vpd_page(int(page, 16))()
     else:
-        raise ValueError("invalid vpd page: %s" % page)
-    if command is None:
-        raise ValueError("unsupported vpd page: %s" % page)
+        command = vpd_page_command(page)
     with asi_context(device) as asi:
-        return sync_wait(asi, command, supresss_output, additional_data)
+        return sync_wait(asi, command, suppress_output=suppress_output, additional_data=additional_data)
 
 def pr_register(device, key):
     from infi.asi.cdb.persist.output import PersistentReserveOutCommand, PERSISTENT_RESERVE_OUT_SERVICE_ACTION_CODES
     command = PersistentReserveOutCommand(service_action=PERSISTENT_RESERVE_OUT_SERVICE_ACTION_CODES.REGISTER,
-                                          service_action_reservation_key=parse_key(key))
+                                          service_action_reservation_key=key)
     pr_out_command(command, device)
 
 def pr_unregister(device, key):
     from infi.asi.cdb.persist.output import PersistentReserveOutCommand, PERSISTENT_RESERVE_OUT_SERVICE_ACTION_CODES
     command = PersistentReserveOutCommand(service_action=PERSISTENT_RESERVE_OUT_SERVICE_ACTION_CODES.REGISTER,
-                                          reservation_key=parse_key(key))
+                                          reservation_key=key)
     pr_out_command(command, device)
 
 def pr_reserve(device, key):
     from infi.asi.cdb.persist.output import PersistentReserveOutCommand, PERSISTENT_RESERVE_OUT_SERVICE_ACTION_CODES
     command = PersistentReserveOutCommand(service_action=PERSISTENT_RESERVE_OUT_SERVICE_ACTION_CODES.RESERVE,
-                                          reservation_key=parse_key(key))
+                                          reservation_key=key)
     pr_out_command(command, device)
 
 def pr_release(device, key):
     from infi.asi.cdb.persist.output import PersistentReserveOutCommand, PERSISTENT_RESERVE_OUT_SERVICE_ACTION_CODES
     command = PersistentReserveOutCommand(service_action=PERSISTENT_RESERVE_OUT_SERVICE_ACTION_CODES.RELEASE,
-                                          reservation_key=parse_key(key))
+                                          reservation_key=key)
     pr_out_command(command, device)
 
 def reserve(device, third_party_device_id):
     from infi.asi.cdb.reserve import Reserve10Command
-    command = Reserve10Command(parse_key(third_party_device_id))
+    command = Reserve10Command(third_party_device_id)
     pr_out_command(command, device)
 
 def release(device, third_party_device_id):
     from infi.asi.cdb.release import Release10Command
-    command = Release10Command(parse_key(third_party_device_id))
+    command = Release10Command(third_party_device_id)
     pr_out_command(command, device)
 
 def luns(device, select_report):
     from infi.asi.cdb.report_luns import ReportLunsCommand
-    command = ReportLunsCommand(select_report=int(select_report))
+    command = ReportLunsCommand(select_report=select_report)
     pr_out_command(command, device)
 
 def rtpg(device, extended):
@@ -243,10 +386,44 @@ def readcap(device, read_16):
     command = ReadCapacity16Command() if read_16 else ReadCapacity10Command()
     pr_out_command(command, device)
 
-def build_raw_command(cdb, request_length, output_file, send_length, input_file):
-    from infi.asi import SCSIReadCommand, SCSIWriteCommand
-    from hexdump import restore
+def restore_hex(text):
+    """ Converts hex text such as '12 00 00 00 60 00' to bytes; text in a hex dump format is parsed by hexdump """
+    try:
+        return bytes.fromhex(text)
+    except (TypeError, ValueError):
+        from hexdump import restore
+        return restore(text)
+
+def cdb_bytes(cdb):
+    """ Converts the <cdb> arguments to bytes; a list of single-byte hex tokens is parsed without joining it """
+    if not isinstance(cdb, list):
+        return restore_hex(cdb)
+    buffer = bytearray(len(cdb))
+    try:
+        for index, token in enumerate(cdb):
+            # int() alone would also accept signs and non-ascii digits
+            if len(token) > 2 or not token or not all(char in HEX_DIGITS for char in token):
+                raise ValueError(token)
+            buffer[index] = int(token, 16)
+    except ValueError:
+        return restore_hex(' '.join(cdb))
+    return bytes(buffer)
+
+def read_into_buffer(stream, length):
+    """ Reads up to length bytes from a binary stream directly into a preallocated bytearray """
+    data = bytearray(length)
+    view = memoryview(data)
+    offset = 0
+    while offset < length:
+        count = stream.readinto(view[offset:])
+        if not count:
+            break
+        offset += count
+    view.release()
+    del data[offset:]
+    return data
 
+def build_raw_command(cdb, request_length, output_file, send_length, input_file):
     class CDB(object):
         def create_datagram(self):
             return cdb_raw
@@ -254,69 +431,59 @@ def build_raw_command(cdb, request_length, output_file, send_length, input_file)
         def execute(self, executer):
             datagram = self.create_datagram()
             if send_length:
-                result_datagram = yield executer.call(SCSIWriteCommand(datagram, data))
+                # executers that copy the data into their own buffers accept the bytearray as is
+                buffer_data = data if getattr(executer, 'accepts_buffer_data', False) else bytes(data)
+                result_datagram = yield executer.call(SCSIWriteCommand(datagram, buffer_data))
             else:
-                result_datagram = yield executer.call(SCSIReadCommand(datagram, request_length))
+                command = SCSIReadCommand(datagram, request_length)
+                # the response is written to the output file right away, so a view of the executer's buffer will do
+                command.accepts_buffer_response = bool(output_file)
+                result_datagram = yield executer.call(command)
             yield result_datagram
 
         def __str__(self):
-            return cdb_raw
-
-    cdb_raw = restore(' '.join(cdb) if isinstance(cdb, list) else cdb)
+            return binascii.hexlify(cdb_raw).decode()
 
-    if request_length is None:
-        request_length = 0
-    elif request_length.isdigit():
-        request_length = int(request_length)
-    elif request_length.startswith('0x'):
-        request_length = int(request_length, 16)
-    else:
-        raise ValueError("invalid request length: %s" % request_length)
-
-    if send_length is None:
-        send_length = 0
-    elif send_length.isdigit():
-        send_length = int(send_length)
-    elif send_length.startswith('0x'):
-        send_length = int(send_length, 16)
-    else:
-        raise ValueError("invalid send length: %s" % send_length)
+    cdb_raw = cdb_bytes(cdb)
+    request_length = request_length or 0
+    send_length = send_length or 0
 
-    data = ''
+    data = bytearray()
     if send_length:
         if input_file == '<stdin>':
-            data = sys.stdin.read(send_length)
+            data = read_into_buffer(getattr(sys.stdin, 'buffer', sys.stdin), send_length)
         else:
-            with open(input_file) as fd:
-                data = fd.read(send_length)
+            with open(input_file, 'rb') as fd:
+                data = read_into_buffer(fd, send_length)
     assert len(data) == send_length
 
     return CDB()
 
+def write_to_file(path, data):
+    """ Writes binary data to a file with os.write, without a buffered file object copying it first """
+    fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC | getattr(os, 'O_BINARY', 0), 0o644)
+    try:
+        view = memoryview(data)
+        while len(view):
+            view = view[os.write(fd, view):]
+    finally:
+        os.close(fd)
+
 def raw(device, cdb, request_length, output_file, send_length, input_file):
     command = build_raw_command(cdb, request_length, output_file, send_length, input_file)
+    execute = make_sync_wait(suppress_output=True)
     with asi_context(device) as asi:
-        result = sync_wait(asi, command, supresss_output=True)
+        result = execute(asi, command)
         if output_file:
-            with open(output_file, 'w') as fd:
-                fd.write(result)
+            write_to_file(output_file, result or b'')
 
 def logs(device, page):
     from infi.asi.cdb.log_sense import LogSenseCommand
-    if page is None:
-        page = 0
-    elif page.isdigit():
-        page = int(page)
-    elif page.startswith('0x'):
-        page = int(page, 16)
-    else:
-        raise ValueError("invalid vpd page: %s" % page)
-    command = LogSenseCommand(page_code=page)
+    command = LogSenseCommand(page_code=page or 0)
     pr_out_command(command, device)
 
 def reset(device, target_reset, host_reset, lun_reset):
-    from infi.os_info import get_platform_string
-    if get_platform_string().startswith('linux'):
+    if PLATFORM_NAME == 'linux':
         from infi.sgutils import sg_reset
         if target_reset:
             sg_reset.target_reset(device)
@@ -327,6 +494,67 @@ def reset(device, target_reset, host_reset, lun_reset):
     else:
         raise NotImplementedError("task management commands not supported on this platform")
 
+COMMANDS = [('turs', []),
+            ('inq', []),
+            ('luns', []),
+            ('rtpg', []),
+            ('readcap', []),
+            ('pr_readkeys', []),
+            ('pr_readreservation', []),
+            ('pr_register', ['<key>']),
+            ('pr_unregister', ['<key>']),
+            ('pr_reserve', ['<key>']),
+            ('pr_release', ['<key>']),
+            ('reserve', ['<third_party_device_id>']),
+            ('release', ['<third_party_device_id>']),
+            ('raw', ['<cdb>']),
+            ('logs', []),
+            ('reset', [])]
+
+def build_argument_parser():
+    # like docopt, options are accepted anywhere on the command line, before the command or between positionals,
+    # so the positionals are collected as they are and matched against the command in parse_arguments
+    usage = __doc__.split('Usage:')[1].split('Options:')[0].strip()
+    parser = ArgumentParser(prog='asi-utils', usage=usage, add_help=False)
+    parser.add_argument('-n', '--number', dest='--number', default='1')
+    parser.add_argument('-p', '--page', dest='--page')
+    parser.add_argument('-s', '--select', dest='--select', default='0')
+    parser.add_argument('--request', dest='--request')
+    parser.add_argument('--outfile', dest='--outfile')
+    parser.add_argument('--infile', dest='--infile', default='<stdin>')
+    parser.add_argument('--send', dest='--send')
+    for flags in (['--extended'], ['-l', '--long'], ['-r', '--raw'], ['-h', '--hex'], ['-j', '--json'],
+                  ['-v', '--verbose'], ['-V', '--version'], ['--help']):
+        parser.add_argument(*flags, dest=flags[-1], action='store_true')
+    reset_type = parser.add_mutually_exclusive_group()
+    for flag in ('--target', '--host', '--device'):
+        reset_type.add_argument(flag, dest=flag, action='store_true')
+    parser.add_argument('command', nargs='?', choices=[name for name, _ in COMMANDS])
+    parser.add_argument('positionals', nargs='*')
+    return parser
+
+# built once at import time, parsing the command line is then just a matter of matching it against the parser
+ArgumentsParser = build_argument_parser()
+
+def parse_arguments(argv):
+    """ Parses the command line into a dictionary of the same shape docopt returns for the usage string """
+    arguments = vars(ArgumentsParser.parse_intermixed_args(argv))
+    command = arguments.pop('command')
+    positionals = arguments.pop('positionals')
+    arguments.update({'<device>': None, '<key>': None, '<third_party_device_id>': None, '<cdb>': []})
+    if command is None:
+        if positionals or not (arguments['--help'] or arguments['--version']):
+            ArgumentsParser.error("a command is required")
+    else:
+        names = ['<device>'] + dict(COMMANDS)[command]
+        if names[-1] == '<cdb>' and len(positionals) >= len(names):
+            positionals = positionals[:len(names) - 1] + [positionals[len(names) - 1:]]
+        if len(positionals) != len(names):
+            ArgumentsParser.error("expected: asi-utils %s [options] %s" % (command, ' '.join(names)))
+        arguments.update(zip(names, positionals))
+    arguments.update((name, name == command) for name, _ in COMMANDS)
+    return arguments
+
 def set_formatters(arguments):
     # Output formatters for specific commands
     result_formatters = {'readcap': formatters.ReadcapOutputFormatter,
@@ -335,32 +563,42 @@ def set_formatters(arguments):
                          'luns': formatters.LunsOutputFormatter,
                          'rtpg': formatters.RtpgOutputFormatter,
                          'inq': formatters.InqOutputFormatter}
+    output_context = get_output_context()
     for key, formatter_class in result_formatters.items():
         if arguments[key]:
-            ActiveOutputContext.set_result_formatter(formatter_class())
+            output_context.set_result_formatter(formatter_class())
     # Hex/raw/json modes override
     if arguments['--hex']:
-        ActiveOutputContext.set_formatters(formatters.HexOutputFormatter())
+        output_context.set_formatters(HEX_FORMATTER)
     elif arguments['--raw']:
-        ActiveOutputContext.set_formatters(formatters.RawOutputFormatter())
+        output_context.set_formatters(RAW_FORMATTER)
     elif arguments['--json']:
-        ActiveOutputContext.set_formatters(formatters.JsonOutputFormatter())
+        output_context.set_formatters(JSON_FORMATTER)
 
 @exception_handler
-def main(argv=sys.argv[1:]):
-    from infi.asi_utils.__version__ import __version__
-    arguments = docopt.docopt(__doc__, version=__version__)
-
+def main(argv=None):
+    # sys.argv is read when main runs, wrappers may change it after the package is imported
+    arguments = parse_arguments(sys.argv[1:] if argv is None else argv)
+    if arguments['--help']:
+        print(__doc__.strip())
+        raise SystemExit(0)
+    if arguments['--version']:
+        from infi.asi_utils.__version__ import __version__
+        print(__version__)
+        raise SystemExit(0)
+
+    output_context = OutputContext()
     if arguments['--verbose']:
-        ActiveOutputContext.enable_verbose()
+        output_context.enable_verbose()
+    ActiveOutputContext.set(output_context)
     set_formatters(arguments)
 
     if arguments['turs']:
-        turs(arguments['<device>'], number=arguments['--number'])
+        turs(arguments['<device>'], number=parse_number(arguments['--number'], 'number'))
     elif arguments['inq']:
-        inq(arguments['<device>'], page=arguments['--page'])
+        inq(arguments['<device>'], page=parse_numbers(arguments['--page'], 'vpd page'))
     elif arguments['luns']:
-        luns(arguments['<device>'], select_report=arguments['--select'])
+        luns(arguments['<device>'], select_report=parse_number(arguments['--select'], 'select report'))
     elif arguments['rtpg']:
         rtpg(arguments['<device>'], extended=arguments['--extended'])
     elif arguments['readcap']:
@@ -368,25 +606,27 @@ def main(argv=sys.argv[1:]):
     elif arguments['pr_readkeys']:
         pr_readkeys(arguments['<device>'])
     elif arguments['pr_register']:
-        pr_register(arguments['<device>'], arguments['<key>'])
+        pr_register(arguments['<device>'], parse_number(arguments['<key>'], 'key'))
     elif arguments['pr_unregister']:
-        pr_unregister(arguments['<device>'], arguments['<key>'])
+        pr_unregister(arguments['<device>'], parse_number(arguments['<key>'], 'key'))
     elif arguments['pr_reserve']:
-        pr_reserve(arguments['<device>'], arguments['<key>'])
+        pr_reserve(arguments['<device>'], parse_number(arguments['<key>'], 'key'))
     elif arguments['pr_release']:
-        pr_release(arguments['<device>'], arguments['<key>'])
+        pr_release(arguments['<device>'], parse_number(arguments['<key>'], 'key'))
     elif arguments['reserve']:
-        reserve(arguments['<device>'], arguments['<third_party_device_id>'])
+        reserve(arguments['<device>'], parse_number(arguments['<third_party_device_id>'], 'third party device id'))
     elif arguments['release']:
-        release(arguments['<device>'], arguments['<third_party_device_id>'])
+        release(arguments['<device>'], parse_number(arguments['<third_party_device_id>'], 'third party device id'))
     elif arguments['pr_readreservation']:
         pr_readreservation(arguments['<device>'])
     elif arguments['raw']:
         raw(arguments['<device>'], cdb=arguments['<cdb>'],
-            request_length=arguments['--request'], output_file=arguments['--outfile'],
-            send_length=arguments['--send'], input_file=arguments['--infile'])
+            request_length=parse_number(arguments['--request'], 'request length'),
+            output_file=arguments['--outfile'],
+            send_length=parse_number(arguments['--send'], 'send length'),
+            input_file=arguments['--infile'])
     elif arguments['logs']:
-        logs(arguments['<device>'], page=arguments['--page'])
+        logs(arguments['<device>'], page=parse_number(arguments['--page'], 'log page'))
     elif arguments['reset']:
         reset(arguments['<device>'], target_reset=arguments['--target'],
               host_reset=arguments['--host'], lun_reset=arguments['--device'])
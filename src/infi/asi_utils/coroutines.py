@@ -0,0 +1,67 @@
+from infi.asi import OSAsyncIOToken
+from infi.asi.coroutines.sync_adapter import AsyncCoroutine, sync_wait
+from itertools import islice
+
+
+class PendingResponse(OSAsyncIOToken):
+    """ Token yielded by a command waiting for its response; resolved by the executer's send callback """
+
+    def __init__(self):
+        super(PendingResponse, self).__init__()
+        self.result = None
+
+    def callback(self, data, exception):
+        self.result = data if exception is None else exception
+
+    def get_result(self, block=False):
+        # an exception here is thrown back into the waiting command by the coroutine
+        return self.result
+
+
+class QueuedExecuter(object):
+    """ Executer proxy that sends a command and suspends the calling coroutine until the response arrives, so
+    several commands can be queued on the underlying executer at once """
+
+    def __init__(self, executer):
+        super(QueuedExecuter, self).__init__()
+        self.executer = executer
+
+    def call(self, command):
+        pending = PendingResponse()
+        yield self.executer.send(command, callback=pending.callback)
+        data = yield pending
+        yield data
+
+
+def _loop(coroutine, errors):
+    try:
+        coroutine.loop()
+    except Exception as error:
+        errors[coroutine] = error
+
+
+def execute_concurrently(executer, commands):
+    """ Executes the commands with as many of them in flight as the executer's queue allows,
+    and yields their results in order; the results of the commands before a failed one are yielded
+    before its error is raised """
+    queue_size = max(getattr(executer, 'max_queue_size', 1), 1)
+    queued_executer = QueuedExecuter(executer)
+    commands = iter(commands)
+    while True:
+        coroutines = [AsyncCoroutine(command.execute(queued_executer)) for command in islice(commands, queue_size)]
+        if not coroutines:
+            return
+        errors = {}
+        for coroutine in coroutines:
+            _loop(coroutine, errors)
+        pending = [coroutine for coroutine in coroutines if not coroutine.is_done() and coroutine not in errors]
+        while pending:
+            sync_wait(executer.wait())
+            for coroutine in pending:
+                coroutine.async_io_complete()
+                _loop(coroutine, errors)
+            pending = [coroutine for coroutine in pending if not coroutine.is_done() and coroutine not in errors]
+        for coroutine in coroutines:
+            if coroutine in errors:
+                raise errors[coroutine]
+            yield coroutine.get_result()
@@ -0,0 +1,143 @@
+import os
+import mmap
+from ctypes import CDLL, addressof, c_char, c_int, c_ulong, c_void_p, create_string_buffer, get_errno, memmove, memset
+from infi.asi import SCSIReadCommand, gevent_friendly
+from infi.asi import linux
+from infi.asi.unix import UnixFile
+from infi.asi.executers import SG_TIMEOUT_IN_MS
+from infi.pyutils.contexts import contextmanager
+
+
+_libc = CDLL(None, use_errno=True)
+_libc.ioctl.argtypes = [c_int, c_ulong, c_void_p]
+_libc.ioctl.restype = c_int
+
+
+def ioctl(fd, request, address):
+    """ Calls ioctl(2) through ctypes, which releases the GIL while the call blocks in the kernel """
+    if _libc.ioctl(fd, request, address) < 0:
+        errno = get_errno()
+        raise IOError(errno, os.strerror(errno))
+
+
+class MappedDataView(object):
+    """ Stands in for the ctypes data buffer of a request, so its response is returned as a view of the slot's
+    mapping instead of a copy. The view is only valid until the slot is reused """
+
+    def __init__(self, data, length):
+        super(MappedDataView, self).__init__()
+        self.raw = memoryview(data)[:length]
+
+
+class RequestBuffers(object):
+    """ The sg header, cdb, sense and data buffers of one request slot, allocated once and reused by every command
+    sent through the slot. The data buffer is an anonymous mapping, so it is page-aligned for direct I/O """
+
+    def __init__(self):
+        super(RequestBuffers, self).__init__()
+        self.header = create_string_buffer(linux.SGIO.sizeof())
+        self.sgio = linux.SGIO.from_buffer(self.header)
+        self.sgio.source_buffer = self.header
+        self.sgio.init_sense_buffer()
+        self.cdb = create_string_buffer(16)
+        self.data = None
+
+    def _data_view(self, length):
+        if self.data is None or len(self.data) < length:
+            self.data = mmap.mmap(-1, (length + mmap.PAGESIZE - 1) // mmap.PAGESIZE * mmap.PAGESIZE)
+        return (c_char * length).from_buffer(self.data)
+
+    def prepare(self, command, pack_id, timeout):
+        sgio = self.sgio
+        memset(self.header, 0, len(self.header))
+        sgio.interface_id = ord('S')
+        sgio.pack_id = pack_id
+        sgio.timeout = timeout
+        sgio.flags = linux.SG_FLAG_DIRECT_IO
+        sgio.sbp = addressof(sgio.sense_buffer)
+        sgio.mx_sb_len = len(sgio.sense_buffer)
+        # the whole sense buffer is read on a check condition, so don't leave the previous command's sense in it
+        memset(sgio.sense_buffer, 0, len(sgio.sense_buffer))
+
+        if len(self.cdb) < len(command.command):
+            self.cdb = create_string_buffer(len(command.command))
+        memmove(self.cdb, command.command, len(command.command))
+        sgio.cmdp = addressof(self.cdb)
+        sgio.cmd_len = len(command.command)
+
+        if isinstance(command, SCSIReadCommand):
+            if command.max_response_length > 0:
+                sgio.dxfer_direction = linux.SG_DXFER_FROM_DEV
+                # the whole buffer is returned even when the device sends less, so clear what the slot held before
+                view = self._data_view(command.max_response_length)
+                memset(view, 0, command.max_response_length)
+                sgio.set_data_buffer(view)
+                if getattr(command, 'accepts_buffer_response', False):
+                    # the response is read from the data buffer's raw attribute once the command completes
+                    sgio.data_buffer = MappedDataView(self.data, command.max_response_length)
+            else:
+                sgio.dxfer_direction = linux.SG_DXFER_NONE
+                sgio.set_data_buffer(None)
+        else:
+            length = len(command.data)
+            sgio.dxfer_direction = linux.SG_DXFER_TO_DEV
+            if length > 0:
+                sgio.set_data_buffer(self._data_view(length))
+                self.data[:length] = command.data
+            else:
+                # an empty mapping is invalid, and there is nothing to transfer anyway
+                sgio.set_data_buffer(None)
+        return sgio
+
+
+class RequestBuffersMixin(object):
+    """ Prepares commands in per-slot RequestBuffers instead of allocating new ctypes buffers for each one """
+
+    # the data of write commands is copied into the slot's mapping, so any buffer object will do
+    accepts_buffer_data = True
+
+    def __init__(self, *args, **kwargs):
+        super(RequestBuffersMixin, self).__init__(*args, **kwargs)
+        self._request_buffers = {}
+
+    def _os_prepare_to_send(self, command, packet_index):
+        if packet_index not in self._request_buffers:
+            self._request_buffers[packet_index] = RequestBuffers()
+        return self._request_buffers[packet_index].prepare(command, packet_index, self.timeout)
+
+
+class LinuxCommandExecuter(RequestBuffersMixin, linux.LinuxCommandExecuter):
+    pass
+
+
+class LinuxIoctlCommandExecuter(RequestBuffersMixin, linux.LinuxIoctlCommandExecuter):
+    def _os_send(self, os_data):
+        # the kernel fills the status fields of the sg header in place, so read the header back after the call
+        gevent_friendly(ioctl)(self.io.fd, linux.SG_IO, addressof(os_data.source_buffer))
+        self.buffer = os_data.to_raw()
+        yield len(self.buffer)
+
+
+def open_device(device):
+    # infi.asi's create_os_file looks the platform up again on every call
+    return UnixFile(os.open(device, os.O_RDWR))
+
+
+@contextmanager
+def linux_sg(device):
+    handle = open_device(device)
+    executer = LinuxCommandExecuter(handle, timeout=SG_TIMEOUT_IN_MS)
+    try:
+        yield executer
+    finally:
+        handle.close()
+
+
+@contextmanager
+def linux_dm(device):
+    handle = open_device(device)
+    executer = LinuxIoctlCommandExecuter(handle)
+    try:
+        yield executer
+    finally:
+        handle.close()
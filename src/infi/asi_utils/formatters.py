@@ -13,7 +13,7 @@ class OutputFormatter(object):
         """ Utility method that converts the output to a byte sequence """
         data = bytes(type(item).write_to_string(item)) if isinstance(item, Struct) else \
                bytes(item.pack()) if isinstance(item, Buffer) else \
-               '' if item is None else bytes(item)
+               b'' if item is None else bytes(item)
         return data
 
     def _to_dict(self, item):
@@ -37,7 +37,7 @@ class OutputFormatter(object):
             return ret
 
         if isinstance(item, bytearray):
-            return '0x' + binascii.hexlify(item) if item else ''
+            return '0x' + binascii.hexlify(item).decode() if item else ''
 
         if isinstance(item, list):
             return [self._to_dict(x) for x in item]
@@ -48,7 +48,8 @@ class OutputFormatter(object):
 class RawOutputFormatter(OutputFormatter):
 
     def format(self, item):
-        return self._to_bytes(item).decode()
+        # the response is binary, so it is returned as bytes and written to the output stream as is
+        return self._to_bytes(item)
 
 
 class HexOutputFormatter(OutputFormatter):
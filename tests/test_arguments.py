@@ -0,0 +1,92 @@
+import unittest
+from unittest import mock
+import six.moves
+from infi.asi_utils import main, parse_arguments, parse_number, parse_numbers
+
+
+class ArgumentsTestCase(unittest.TestCase):
+
+    def test_defaults(self):
+        arguments = parse_arguments(['turs', '/dev/sg0'])
+        self.assertTrue(arguments['turs'])
+        self.assertFalse(arguments['inq'])
+        self.assertEqual(arguments['<device>'], '/dev/sg0')
+        self.assertEqual(arguments['--number'], '1')
+        self.assertEqual(arguments['--select'], '0')
+        self.assertEqual(arguments['--infile'], '<stdin>')
+        self.assertFalse(arguments['--verbose'])
+
+    def test_options(self):
+        arguments = parse_arguments(['inq', '-v', '/dev/sg0', '--page=0x80', '-h'])
+        self.assertTrue(arguments['inq'])
+        self.assertEqual(arguments['--page'], '0x80')
+        self.assertTrue(arguments['--verbose'])
+        self.assertTrue(arguments['--hex'])
+
+    def test_positionals(self):
+        arguments = parse_arguments(['raw', '/dev/sg0', '12', '00', '00', '00', '60', '00', '--request=96'])
+        self.assertEqual(arguments['<cdb>'], ['12', '00', '00', '00', '60', '00'])
+        self.assertEqual(arguments['--request'], '96')
+        arguments = parse_arguments(['pr_register', '/dev/sg0', '0x1234'])
+        self.assertEqual(arguments['<key>'], '0x1234')
+
+    def test_options_before_command(self):
+        arguments = parse_arguments(['-v', 'turs', '/dev/sg0'])
+        self.assertTrue(arguments['turs'])
+        self.assertTrue(arguments['--verbose'])
+        arguments = parse_arguments(['-j', '--page=0x83', 'inq', '/dev/sg0'])
+        self.assertTrue(arguments['--json'])
+        self.assertEqual(arguments['--page'], '0x83')
+
+    def test_options_between_positionals(self):
+        arguments = parse_arguments(['raw', '/dev/sg0', '12', '--request=96', '00'])
+        self.assertEqual(arguments['<cdb>'], ['12', '00'])
+        self.assertEqual(arguments['--request'], '96')
+
+    def test_reset_types_are_exclusive(self):
+        self.assertTrue(parse_arguments(['reset', '/dev/sg0', '--host'])['--host'])
+        with self.assertRaises(SystemExit):
+            parse_arguments(['reset', '/dev/sg0', '--target', '--host'])
+
+    def test_main_reads_argv_when_called(self):
+        with mock.patch('sys.argv', ['asi-utils', '--help']), mock.patch('sys.stdout', six.moves.StringIO()) as stdout:
+            with self.assertRaises(SystemExit) as context:
+                main()
+        self.assertEqual(context.exception.code, 0)
+        self.assertTrue(stdout.getvalue().startswith('asi-utils'))
+
+    def test_missing_device(self):
+        with self.assertRaises(SystemExit):
+            parse_arguments(['turs'])
+
+    def test_wrong_positionals(self):
+        with self.assertRaises(SystemExit):
+            parse_arguments(['pr_register', '/dev/sg0'])
+        with self.assertRaises(SystemExit):
+            parse_arguments(['turs', '/dev/sg0', 'extra'])
+        with self.assertRaises(SystemExit):
+            parse_arguments(['raw', '/dev/sg0'])
+
+    def test_numbers(self):
+        self.assertEqual(parse_number('80', 'vpd page'), 80)
+        self.assertEqual(parse_number('0x80', 'vpd page'), 0x80)
+        self.assertEqual(parse_number('010', 'vpd page'), 10)
+        self.assertIsNone(parse_number(None, 'vpd page'))
+        with self.assertRaises(ValueError):
+            parse_number('serial', 'vpd page')
+
+    def test_invalid_keys(self):
+        arguments = parse_arguments(['pr_register', '/dev/sg0', '-5'])
+        self.assertEqual(arguments['<key>'], '-5')
+        with self.assertRaises(ValueError):
+            parse_number(arguments['<key>'], 'key')
+
+    def test_invalid_numbers(self):
+        for value in ('-5', '+5', ' 5', '1_000', '0x', '0x-5', '0x_5', '0x 5', '\u00b2'):
+            with self.assertRaises(ValueError):
+                parse_number(value, 'request length')
+
+    def test_number_lists(self):
+        self.assertEqual(parse_numbers('0x80', 'vpd page'), 0x80)
+        self.assertEqual(parse_numbers('0x00,0x80,131', 'vpd page'), [0x00, 0x80, 0x83])
+        self.assertIsNone(parse_numbers(None, 'vpd page'))
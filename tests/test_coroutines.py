@@ -0,0 +1,124 @@
+import unittest
+import warnings
+import infi.asi_utils
+from infi.asi import CommandExecuterBase
+from infi.asi.cdb import tur
+from infi.asi.errors import AsiSCSIError
+from infi.asi_utils import formatters
+from infi.asi_utils.coroutines import execute_concurrently
+from test_output import FakeOutput
+
+
+class FakeQueuedExecuter(CommandExecuterBase):
+    def __init__(self, max_queue_size=4, fail_at=None):
+        super(FakeQueuedExecuter, self).__init__(max_queue_size)
+        self.fail_at = fail_at
+        self.in_flight = []
+        self.sent = 0
+        self.max_in_flight = 0
+
+    def _os_prepare_to_send(self, command, packet_index):
+        return packet_index
+
+    def _os_send(self, os_data):
+        self.sent += 1
+        self.in_flight.append((os_data, self.sent))
+        self.max_in_flight = max(self.max_in_flight, len(self.in_flight))
+        yield True
+
+    def _os_receive(self):
+        packet_id, number = self.in_flight.pop(0)
+        if number == self.fail_at:
+            yield (AsiSCSIError("fake error"), packet_id)
+        else:
+            yield (None, packet_id)
+
+
+class ExecuteConcurrentlyTestCase(unittest.TestCase):
+
+    def test_queue_is_filled(self):
+        executer = FakeQueuedExecuter(max_queue_size=4)
+        results = list(execute_concurrently(executer, [tur.TestUnitReadyCommand() for i in range(10)]))
+        self.assertEqual(results, [True] * 10)
+        self.assertEqual(executer.sent, 10)
+        self.assertEqual(executer.max_in_flight, 4)
+
+    def _execute_until_error(self, executer, count):
+        results = []
+        with self.assertRaises(AsiSCSIError):
+            for result in execute_concurrently(executer, [tur.TestUnitReadyCommand() for i in range(count)]):
+                results.append(result)
+        return results
+
+    def test_error_stops_submission(self):
+        executer = FakeQueuedExecuter(max_queue_size=4, fail_at=1)
+        self.assertEqual(self._execute_until_error(executer, 10), [])
+        self.assertEqual(executer.sent, 4)
+
+    def test_results_before_error_are_yielded(self):
+        executer = FakeQueuedExecuter(max_queue_size=4, fail_at=6)
+        self.assertEqual(self._execute_until_error(executer, 10), [True] * 5)
+        self.assertEqual(executer.sent, 8)
+        self.assertEqual(executer.in_flight, [])
+
+    def test_sync_wait_all_output(self):
+        output = FakeOutput()
+        token = infi.asi_utils.ActiveOutputContext.set(output)
+        try:
+            infi.asi_utils.sync_wait_all(FakeQueuedExecuter(), [tur.TestUnitReadyCommand() for i in range(3)])
+        finally:
+            infi.asi_utils.ActiveOutputContext.reset(token)
+        self.assertEqual(output.stdout.getvalue(), 'true' * 3)
+
+
+class SyncWaitTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.output = FakeOutput()
+        self.token = infi.asi_utils.ActiveOutputContext.set(self.output)
+        self.command = tur.TestUnitReadyCommand()
+        self.formatted_command = formatters.DefaultOutputFormatter().format(self.command)
+
+    def tearDown(self):
+        infi.asi_utils.ActiveOutputContext.reset(self.token)
+
+    def test_make_sync_wait(self):
+        self.assertTrue(infi.asi_utils.make_sync_wait(suppress_output=True)(FakeQueuedExecuter(), self.command))
+        self.assertEqual(self.output.stdout.getvalue(), '')
+        infi.asi_utils.make_sync_wait()(FakeQueuedExecuter(), self.command)
+        self.assertEqual(self.output.stdout.getvalue(), 'true')
+
+    def test_make_sync_wait_verbose(self):
+        self.output.enable_verbose()
+        self.assertTrue(infi.asi_utils.make_sync_wait(suppress_output=True)(FakeQueuedExecuter(), self.command))
+        self.assertEqual(self.output.stdout.getvalue(), self.formatted_command)
+        infi.asi_utils.make_sync_wait()(FakeQueuedExecuter(), self.command)
+        self.assertEqual(self.output.stdout.getvalue(), self.formatted_command * 2 + 'true')
+
+    def test_sync_wait_all_verbose(self):
+        self.output.enable_verbose()
+        commands = [self.command] * 5
+        infi.asi_utils.sync_wait_all(FakeQueuedExecuter(max_queue_size=4), commands)
+        self.assertEqual(self.output.stdout.getvalue(), (self.formatted_command + 'true') * 5)
+
+    def test_sync_wait_all_verbose_error(self):
+        self.output.enable_verbose()
+        with self.assertRaises(AsiSCSIError):
+            infi.asi_utils.sync_wait_all(FakeQueuedExecuter(max_queue_size=4, fail_at=3), [self.command] * 5)
+        self.assertEqual(self.output.stdout.getvalue(), (self.formatted_command + 'true') * 2 + self.formatted_command)
+
+    def test_sync_wait_all_without_results(self):
+        results = infi.asi_utils.sync_wait_all(FakeQueuedExecuter(), [self.command] * 3, keep_results=False)
+        self.assertIsNone(results)
+        self.assertEqual(self.output.stdout.getvalue(), 'true' * 3)
+
+    def test_deprecated_suppress_output(self):
+        with warnings.catch_warnings(record=True) as caught:
+            warnings.simplefilter('always')
+            self.assertTrue(infi.asi_utils.sync_wait(FakeQueuedExecuter(), self.command, supresss_output=True))
+        self.assertEqual(self.output.stdout.getvalue(), '')
+        self.assertEqual([warning.category for warning in caught], [DeprecationWarning])
+        with self.assertRaises(TypeError):
+            infi.asi_utils.sync_wait(FakeQueuedExecuter(), self.command, supress_output=True)
+        with self.assertRaises(TypeError):
+            infi.asi_utils.sync_wait(FakeQueuedExecuter(), self.command, True)
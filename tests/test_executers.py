@@ -0,0 +1,102 @@
+import unittest
+from unittest import mock
+from ctypes import addressof, memmove, string_at
+from infi.asi import SCSIReadCommand, SCSIWriteCommand
+from infi.asi import linux
+from infi.asi.coroutines.sync_adapter import sync_wait
+from infi.asi.errors import AsiCheckConditionError
+from infi.asi_utils.executers import LinuxIoctlCommandExecuter
+
+
+class RequestBuffersTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.executer = LinuxIoctlCommandExecuter(io=None)
+
+    def test_read_command(self):
+        sgio = self.executer._os_prepare_to_send(SCSIReadCommand(b'\x12\x00\x00\x00\x60\x00', 96), 0)
+        self.assertEqual(sgio.interface_id, ord('S'))
+        self.assertEqual(sgio.dxfer_direction, linux.SG_DXFER_FROM_DEV)
+        self.assertEqual(sgio.dxfer_len, 96)
+        self.assertEqual(sgio.cmd_len, 6)
+        self.assertEqual(string_at(sgio.cmdp, sgio.cmd_len), b'\x12\x00\x00\x00\x60\x00')
+        self.assertEqual(sgio.mx_sb_len, linux.SENSE_SIZE)
+
+    def test_no_data_command(self):
+        sgio = self.executer._os_prepare_to_send(SCSIReadCommand(b'\x00' * 6, 0), 0)
+        self.assertEqual(sgio.dxfer_direction, linux.SG_DXFER_NONE)
+        self.assertEqual(sgio.dxfer_len, 0)
+        self.assertEqual(sgio.dxferp, None)
+
+    def test_write_command(self):
+        sgio = self.executer._os_prepare_to_send(SCSIWriteCommand(b'\x3b' + b'\x00' * 9, b'data'), 0)
+        self.assertEqual(sgio.dxfer_direction, linux.SG_DXFER_TO_DEV)
+        self.assertEqual(string_at(sgio.dxferp, sgio.dxfer_len), b'data')
+
+    def test_write_command_without_data(self):
+        sgio = self.executer._os_prepare_to_send(SCSIWriteCommand(b'\x56' + b'\x00' * 9, b''), 0)
+        self.assertEqual(sgio.dxfer_direction, linux.SG_DXFER_TO_DEV)
+        self.assertEqual(sgio.dxfer_len, 0)
+        self.assertEqual(sgio.dxferp, None)
+
+    def test_reused_buffers_are_cleared(self):
+        write = self.executer._os_prepare_to_send(SCSIWriteCommand(b'\x3b' + b'\x00' * 9, b'SECRETDATA' * 10), 0)
+        memmove(write.sbp, b'\x70' * linux.SENSE_SIZE, linux.SENSE_SIZE)
+        read = self.executer._os_prepare_to_send(SCSIReadCommand(b'\x12\x00\x00\x00\x60\x00', 96), 0)
+        self.assertEqual(read.dxferp, write.dxferp)
+        memmove(read.dxferp, b'ABCD', 4)
+        self.assertEqual(string_at(read.dxferp, read.dxfer_len), b'ABCD' + b'\x00' * 92)
+        self.assertEqual(string_at(read.sbp, linux.SENSE_SIZE), b'\x00' * linux.SENSE_SIZE)
+
+    def test_buffers_are_reused(self):
+        first = self.executer._os_prepare_to_send(SCSIReadCommand(b'\x12' + b'\x00' * 5, 96), 0)
+        first_addresses = (addressof(first), first.cmdp, first.sbp, first.dxferp)
+        second = self.executer._os_prepare_to_send(SCSIReadCommand(b'\x12' + b'\x00' * 5, 64), 0)
+        self.assertEqual((addressof(second), second.cmdp, second.sbp, second.dxferp), first_addresses)
+        self.assertEqual(second.dxfer_len, 64)
+
+    def test_buffer_response(self):
+        command = SCSIReadCommand(b'\x12\x00\x00\x00\x04\x00', 4)
+        command.accepts_buffer_response = True
+        sgio = self.executer._os_prepare_to_send(command, 0)
+        memmove(sgio.dxferp, b'data', 4)
+        self.assertIsInstance(sgio.data_buffer.raw, memoryview)
+        self.assertEqual(sgio.data_buffer.raw.tobytes(), b'data')
+
+
+class FakeDevice(object):
+    fd = -1
+
+
+# fixed format sense data: ILLEGAL REQUEST, INVALID COMMAND OPERATION CODE
+ILLEGAL_REQUEST_SENSE = b'\x70\x00\x05\x00\x00\x00\x00\x0a\x00\x00\x00\x00\x20\x00\x00\x00\x00\x00'
+
+
+def check_condition_ioctl(fd, request, address):
+    # the kernel writes the status fields into the caller's sg header
+    sgio = linux.SGIO.from_address(address)
+    sgio.status = 0x02
+    sgio.driver_status = 0x08
+    sgio.sb_len_wr = len(ILLEGAL_REQUEST_SENSE)
+    memmove(sgio.sbp, ILLEGAL_REQUEST_SENSE, len(ILLEGAL_REQUEST_SENSE))
+
+
+def data_in_ioctl(fd, request, address):
+    sgio = linux.SGIO.from_address(address)
+    memmove(sgio.dxferp, b'data', 4)
+
+
+class LinuxIoctlCommandExecuterTestCase(unittest.TestCase):
+
+    def _call(self, command):
+        return sync_wait(LinuxIoctlCommandExecuter(FakeDevice()).call(command))
+
+    def test_status_is_read_back(self):
+        with mock.patch('infi.asi_utils.executers.ioctl', check_condition_ioctl):
+            with self.assertRaises(AsiCheckConditionError) as context:
+                self._call(SCSIReadCommand(b'\x12\x00\x00\x00\x60\x00', 96))
+        self.assertEqual(context.exception.sense_obj.sense_key, 'ILLEGAL_REQUEST')
+
+    def test_data_in(self):
+        with mock.patch('infi.asi_utils.executers.ioctl', data_in_ioctl):
+            self.assertEqual(self._call(SCSIReadCommand(b'\x12\x00\x00\x00\x04\x00', 4)), b'data')
@@ -1,8 +1,10 @@
+import io
 import unittest
 import infi.asi_utils
 import six.moves
 import sys
-from infi.instruct import Struct, UBInt8
+import threading
+from infi.instruct import Struct, UBInt8, UBInt32
 from infi.instruct.buffer import Buffer, uint_field, bytes_ref
 from infi.asi_utils import formatters
 
@@ -13,7 +15,7 @@ class FakeOutput(infi.asi_utils.OutputContext):
         self.stdout = six.moves.StringIO()
 
     def _print(self, string, file=sys.stdout):
-        self.stdout.write(string)
+        self.stdout.write(string.decode('latin-1') if isinstance(string, bytes) else string)
         self.stdout.flush()
 
 
@@ -60,3 +62,55 @@ class OutputTestCase(unittest.TestCase):
         output.set_formatters(formatters.HexOutputFormatter())
         output.output_result(_buffer)
         self.assertEqual(output.stdout.getvalue(), '00000000: 00                                                .')
+
+    def test_json__bytearray(self):
+        output = FakeOutput()
+        output.set_formatters(formatters.JsonOutputFormatter())
+        output.output_result(bytearray(b'\x12\x34'))
+        self.assertEqual(output.stdout.getvalue(), '"0x1234"')
+
+    def test_raw__high_bytes(self):
+        class Capacity(Struct):
+            _fields_ = [UBInt32('last_lba')]
+
+        self.assertEqual(formatters.RawOutputFormatter().format(Capacity(last_lba=0xffffffff)), b'\xff' * 4)
+        binary = io.BytesIO()
+        stdout = io.TextIOWrapper(binary, encoding='ascii')
+        output = infi.asi_utils.OutputContext()
+        output.set_formatters(formatters.RawOutputFormatter())
+        output.output_result(Capacity(last_lba=0xffffffff), file=stdout)
+        self.assertEqual(binary.getvalue(), b'\xff' * 4 + b'\n')
+
+    def test_raw__none(self):
+        output = FakeOutput()
+        output.set_formatters(formatters.RawOutputFormatter())
+        output.output_result(None)
+        self.assertEqual(output.stdout.getvalue(), '')
+
+    def _run_in_thread(self, target):
+        thread = threading.Thread(target=target)
+        thread.start()
+        thread.join()
+
+    def test_context_is_per_thread(self):
+        thread_outputs = []
+
+        def run():
+            infi.asi_utils.ActiveOutputContext.set(FakeOutput())
+            thread_outputs.append(infi.asi_utils.get_output_context())
+
+        self._run_in_thread(run)
+        self.assertIsInstance(thread_outputs[0], FakeOutput)
+        self.assertIsNot(infi.asi_utils.get_output_context(), thread_outputs[0])
+
+    def test_context_changes_do_not_leak(self):
+        def run():
+            output_context = infi.asi_utils.get_output_context()
+            output_context.enable_verbose()
+            output_context.set_formatters(formatters.HexOutputFormatter())
+
+        self._run_in_thread(run)
+        thread_outputs = []
+        self._run_in_thread(lambda: thread_outputs.append(infi.asi_utils.get_output_context()))
+        self.assertFalse(thread_outputs[0]._verbose)
+        self.assertIsInstance(thread_outputs[0]._result_formatter, formatters.DefaultOutputFormatter)
@@ -0,0 +1,64 @@
+import tempfile
+import unittest
+from infi.asi_utils import build_raw_command, cdb_bytes, read_into_buffer, restore_hex, write_to_file
+
+
+class RawCommandTestCase(unittest.TestCase):
+
+    def test_restore_hex(self):
+        self.assertEqual(restore_hex('12 00 00 00 60 00'), b'\x12\x00\x00\x00\x60\x00')
+        self.assertEqual(restore_hex('120000006000'), b'\x12\x00\x00\x00\x60\x00')
+        self.assertEqual(restore_hex(' '.join(['00'] * 32)), b'\x00' * 32)
+
+    def test_restore_hex_dump(self):
+        self.assertEqual(restore_hex('00000000: 12 00 00 00 60 00                                 ....`.'),
+                         b'\x12\x00\x00\x00\x60\x00')
+
+    def test_cdb_bytes(self):
+        self.assertEqual(cdb_bytes(['12', '0', '00', '00', '60', '00']), b'\x12\x00\x00\x00\x60\x00')
+        self.assertEqual(cdb_bytes(['1200', '00006000']), b'\x12\x00\x00\x00\x60\x00')
+        self.assertEqual(cdb_bytes('12 00 00 00 60 00'), b'\x12\x00\x00\x00\x60\x00')
+        for token in ('+1', '\u0660\u0661', '-1', ' 1'):
+            with self.assertRaises(ValueError):
+                cdb_bytes(['12', token])
+
+    def test_cdb(self):
+        command = build_raw_command(['12', '00', '00', '00', '60', '00'], 96, None, None, '<stdin>')
+        self.assertEqual(command.create_datagram(), b'\x12\x00\x00\x00\x60\x00')
+        self.assertEqual(str(command), '120000006000')
+        command = build_raw_command('12 00 00 00 60 00', 0x60, None, None, '<stdin>')
+        self.assertEqual(command.create_datagram(), b'\x12\x00\x00\x00\x60\x00')
+
+    def test_send_data(self):
+        with tempfile.NamedTemporaryFile() as input_file:
+            input_file.write(b'\x01\x02\x03\x04')
+            input_file.flush()
+            command = build_raw_command(['3b', '00'], None, None, 4, input_file.name)
+        self.assertEqual(command.create_datagram(), b'\x3b\x00')
+
+
+class ReadIntoBufferTestCase(unittest.TestCase):
+
+    def test_short_reads(self):
+        class Pipe(object):
+            def __init__(self, chunks):
+                self.chunks = list(chunks)
+
+            def readinto(self, buffer):
+                if not self.chunks:
+                    return 0
+                chunk = self.chunks.pop(0)
+                buffer[:len(chunk)] = chunk
+                return len(chunk)
+
+        self.assertEqual(read_into_buffer(Pipe([b'ab', b'cd', b'e']), 5), bytearray(b'abcde'))
+        self.assertEqual(read_into_buffer(Pipe([b'ab']), 5), bytearray(b'ab'))
+
+
+class WriteToFileTestCase(unittest.TestCase):
+
+    def test_binary_data(self):
+        with tempfile.NamedTemporaryFile() as output_file:
+            write_to_file(output_file.name, b'\x00\n\xff' * 1000)
+            with open(output_file.name, 'rb') as fd:
+                self.assertEqual(fd.read(), b'\x00\n\xff' * 1000)